@@ -1,18 +1,25 @@
 from dotenv import load_dotenv
 import os
 import logging
-import tempfile
-import pickle
-import requests
+import time
 import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import redis.asyncio
+import httplib2
+import google_auth_httplib2
+from cachetools import TLRUCache
 from flask import Flask
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ChatType
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaUpload
+from googleapiclient.errors import ResumableUploadError
 from datetime import datetime
 from telethon import TelegramClient
 from telethon.tl.types import Document
@@ -33,6 +40,12 @@ CHANNEL_USERNAME = os.getenv("CHANNEL_USERNAME")
 CREATOR_USERNAME = os.getenv("CREATOR_USERNAME")
 ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID"))
 
+# Subscription keyboard shown by /start and when verification fails
+SUBSCRIBE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Subscribe to Channel", url=f"https://t.me/{CHANNEL_USERNAME}")],
+    [InlineKeyboardButton("I've Subscribed", callback_data="check_subscription")]
+])
+
 # Telethon
 API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
@@ -40,32 +53,93 @@ API_HASH = os.getenv("API_HASH")
 # Google Drive
 CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE")
 
+# Redis (optional) - shares cached state across restarts and workers
+REDIS_URL = os.getenv("REDIS_URL")
+
 # Google Drive API scope
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
-# Store user subscription status
-user_subscription_status = {}
+# Cache user subscription status so we don't ask Telegram on every message.
+# Unsubscribed users are only cached briefly so they can start right after subscribing.
+SUBSCRIBED_TTL = 3600  # seconds
+UNSUBSCRIBED_TTL = 60  # seconds
+
+# Each entry holds its own TTL, so status copied from Redis expires with the Redis key
+user_subscription_status = TLRUCache(maxsize=100_000, ttu=lambda _key, ttl, now: now + ttl)
+user_unsubscribed_status = TLRUCache(maxsize=100_000, ttu=lambda _key, ttl, now: now + ttl)
 
 # Global variable to store the folder ID
 TELEGRAM_BOT_FOLDER_ID = None
+FOLDER_ID_KEY = "drive:folder:Telegram Bot"
+
+# Upload threads resolve the folder under this lock so they don't each create one
+_folder_lock = threading.Lock()
+
+# Google Drive credentials are loaded once. Updates are handled concurrently, so
+# several uploads can run on the thread pool at the same time; each thread gets its
+# own service because httplib2 connections are not thread-safe
+_drive_credentials = None
+_drive_credentials_lock = threading.Lock()
+_drive_local = threading.local()
 
 # File size limits (in bytes)
 MAX_FILE_SIZE = 5 * 1024 * 1024 * 1024  # 5GB (Google Drive limit for free accounts)
 
-# Initialize Telethon client
+# Size of the chunks handed from the Telethon download to the upload (a multiple of Telegram's 512KB requests)
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB
+
+# Size of each resumable upload request sent to Google Drive (must be a multiple of 256KB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+
+# Downloaded chunks allowed to wait for the upload before the download pauses
+UPLOAD_QUEUE_DEPTH = 2
+
+# Memory held by one transfer: the queued download chunks plus the one Telethon is
+# assembling (3 x 4MB), the upload buffer with the unacknowledged chunk and the
+# read-ahead of the next one (2 x 8MB + 4MB), and the copy of the chunk being sent (8MB).
+# That is about 40MB per transfer.
+TRANSFER_MEMORY = (UPLOAD_QUEUE_DEPTH + 2) * DOWNLOAD_CHUNK_SIZE + 3 * UPLOAD_CHUNK_SIZE
+
+# Memory all transfers together may use, sized for a small free-tier host
+UPLOAD_MEMORY_BUDGET = 160 * 1024 * 1024  # 160MB
+
+# Concurrent transfers allowed (4 with the sizes above), and threads available to run
+# their Drive uploads plus the occasional folder lookup
+MAX_CONCURRENT_UPLOADS = max(1, UPLOAD_MEMORY_BUDGET // TRANSFER_MEMORY)
+UPLOAD_THREADS = 2 * MAX_CONCURRENT_UPLOADS
+
+# Minimum time between download progress updates (in seconds)
+PROGRESS_UPDATE_INTERVAL = 3
+
+# Telethon client, connected at startup (or on the next download if that failed)
 telethon_client = None
+_telethon_lock = None
+
+# Shared HTTP session and Redis client, created once the bot's event loop is running
+_http_session = None
+_redis = None
+
+# Limits concurrent uploads, created once the bot's event loop is running
+_upload_semaphore = None
 
-def shorten_url(long_url):
+# Keep references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks = set()
+
+async def shorten_url(long_url):
     """
     Shorten a URL using TinyURL API (no limits)
     """
     try:
-        response = requests.get(f"http://tinyurl.com/api-create.php?url={long_url}", timeout=30)
-        if response.status_code == 200:
-            return response.text.strip()
-        else:
-            logger.error(f"TinyURL API error: {response.status_code}")
-            return long_url
+        async with _http_session.get(
+            "http://tinyurl.com/api-create.php",
+            params={"url": long_url},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status == 200:
+                return (await response.text()).strip()
+            else:
+                logger.error(f"TinyURL API error: {response.status}")
+                return long_url
     except Exception as e:
         logger.error(f"Error shortening URL with TinyURL: {e}")
         return long_url
@@ -108,17 +182,70 @@ async def check_subscription(user_id, context):
         logger.error(f"Error checking subscription: {e}")
         return False
 
+async def remember_subscription(user_id, is_subscribed):
+    """Store the result of a subscription check in the matching cache."""
+    if is_subscribed:
+        user_subscription_status[user_id] = SUBSCRIBED_TTL
+        user_unsubscribed_status.pop(user_id, None)
+    else:
+        user_unsubscribed_status[user_id] = UNSUBSCRIBED_TTL
+        user_subscription_status.pop(user_id, None)
+    
+    if _redis:
+        try:
+            await _redis.setex(
+                f"sub:{user_id}",
+                SUBSCRIBED_TTL if is_subscribed else UNSUBSCRIBED_TTL,
+                "1" if is_subscribed else "0"
+            )
+        except Exception as e:
+            logger.error(f"Error saving subscription status to Redis: {e}")
+
+async def is_user_subscribed(user_id, context):
+    """Return the cached subscription status, checking with Telegram on a miss."""
+    if user_subscription_status.get(user_id):
+        return True
+    if user_unsubscribed_status.get(user_id):
+        return False
+    
+    if _redis:
+        key = f"sub:{user_id}"
+        try:
+            async with _redis.pipeline(transaction=False) as pipe:
+                status, ttl = await pipe.get(key).ttl(key).execute()
+        except Exception as e:
+            logger.error(f"Error reading subscription status from Redis: {e}")
+            status = None
+        
+        if status is not None:
+            # Keep a local copy, for only as long as the Redis key has left
+            if ttl > 0:
+                if status == "1":
+                    user_subscription_status[user_id] = ttl
+                else:
+                    user_unsubscribed_status[user_id] = ttl
+            return status == "1"
+    
+    is_subscribed = await check_subscription(user_id, context)
+    await remember_subscription(user_id, is_subscribed)
+    return is_subscribed
+
+async def save_folder_id():
+    """Persist the Google Drive folder ID to Redis so restarts can skip the lookup."""
+    if _redis:
+        try:
+            if TELEGRAM_BOT_FOLDER_ID:
+                await _redis.set(FOLDER_ID_KEY, TELEGRAM_BOT_FOLDER_ID)
+            else:
+                # The saved folder is gone and couldn't be replaced; don't reuse it
+                await _redis.delete(FOLDER_ID_KEY)
+        except Exception as e:
+            logger.error(f"Error saving folder ID to Redis: {e}")
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     user = update.effective_user
     
-    # Create subscription keyboard
-    keyboard = [
-        [InlineKeyboardButton("Subscribe to Channel", url=f"https://t.me/{CHANNEL_USERNAME}")],
-        [InlineKeyboardButton("I've Subscribed", callback_data="check_subscription")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     # Send message with subscription prompt
     await update.message.reply_html(
         f"Hi {user.mention_html()}!\n\n"
@@ -126,7 +253,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"This bot is created by {CREATOR_USERNAME}.\n\n"
         f"To use this bot, please subscribe to our channel @{CHANNEL_USERNAME} first.\n\n"
         "After subscribing, click the 'I've Subscribed' button below.",
-        reply_markup=reply_markup
+        reply_markup=SUBSCRIBE_MARKUP
     )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -134,15 +261,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     # Check if user has subscribed
-    if user_id not in user_subscription_status:
-        # Verify subscription status
-        is_subscribed = await check_subscription(user_id, context)
-        
-        if is_subscribed:
-            user_subscription_status[user_id] = True
-        else:
-            await update.message.reply_text("Please use /start first and subscribe to our channel.")
-            return
+    if not await is_user_subscribed(user_id, context):
+        await update.message.reply_text("Please use /start first and subscribe to our channel.")
+        return
     
     await update.message.reply_text(
         "Just send me any file (document, image, video, audio) and I'll upload it to Google Drive "
@@ -160,9 +281,9 @@ async def handle_subscription_callback(update: Update, context: ContextTypes.DEF
     if query.data == "check_subscription":
         # Actually verify subscription
         is_subscribed = await check_subscription(user_id, context)
+        await remember_subscription(user_id, is_subscribed)
         
         if is_subscribed:
-            user_subscription_status[user_id] = True
             await query.edit_message_text(
                 "Thank you for subscribing! ✅\n\n"
                 "Now you can send me any file and I'll upload it to Google Drive "
@@ -170,15 +291,9 @@ async def handle_subscription_callback(update: Update, context: ContextTypes.DEF
             )
         else:
             # Edit the message to show subscription is still required
-            keyboard = [
-                [InlineKeyboardButton("Subscribe to Channel", url=f"https://t.me/{CHANNEL_USERNAME}")],
-                [InlineKeyboardButton("I've Subscribed", callback_data="check_subscription")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.edit_message_text(
                 "❌ I couldn't verify your subscription. Please make sure you've subscribed to the channel and try again.",
-                reply_markup=reply_markup
+                reply_markup=SUBSCRIBE_MARKUP
             )
 
 def get_or_create_folder(drive_service, folder_name="Telegram Bot"):
@@ -192,33 +307,43 @@ def get_or_create_folder(drive_service, folder_name="Telegram Bot"):
     if TELEGRAM_BOT_FOLDER_ID:
         return TELEGRAM_BOT_FOLDER_ID
     
-    # Check if the folder already exists
-    query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    folders = results.get('files', [])
-    
-    if folders:
-        # Folder exists, return the first one found
-        TELEGRAM_BOT_FOLDER_ID = folders[0]['id']
-        return TELEGRAM_BOT_FOLDER_ID
-    else:
-        # Folder doesn't exist, create it
-        folder_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
-        }
-        folder = drive_service.files().create(body=folder_metadata, fields='id').execute()
-        TELEGRAM_BOT_FOLDER_ID = folder.get('id')
-        logger.info(f"Created folder '{folder_name}' with ID: {TELEGRAM_BOT_FOLDER_ID}")
-        return TELEGRAM_BOT_FOLDER_ID
+    with _folder_lock:
+        # Another thread may have resolved it while we waited for the lock
+        if TELEGRAM_BOT_FOLDER_ID:
+            return TELEGRAM_BOT_FOLDER_ID
+        
+        # Check if the folder already exists (quotes and backslashes must be escaped in queries)
+        escaped_name = folder_name.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"name='{escaped_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        results = drive_service.files().list(
+            q=query,
+            fields="files(id)",
+            pageSize=1,
+            spaces='drive'
+        ).execute()
+        folders = results.get('files', [])
+        
+        if folders:
+            # Folder exists, return the first one found
+            TELEGRAM_BOT_FOLDER_ID = folders[0]['id']
+            return TELEGRAM_BOT_FOLDER_ID
+        else:
+            # Folder doesn't exist, create it
+            folder_metadata = {
+                'name': folder_name,
+                'mimeType': 'application/vnd.google-apps.folder'
+            }
+            folder = drive_service.files().create(body=folder_metadata, fields='id').execute()
+            TELEGRAM_BOT_FOLDER_ID = folder.get('id')
+            logger.info(f"Created folder '{folder_name}' with ID: {TELEGRAM_BOT_FOLDER_ID}")
+            return TELEGRAM_BOT_FOLDER_ID
 
 def authenticate_google_drive():
-    """Authenticate and create a Google Drive service for desktop application."""
+    """Authenticate with Google Drive for desktop application and return the credentials."""
     creds = None
-    # The file token.pickle stores the user's access and refresh tokens
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
+    # The file token.json stores the user's access and refresh tokens
+    if os.path.exists('token.json'):
+        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
     
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
@@ -230,19 +355,127 @@ def authenticate_google_drive():
             creds = flow.run_local_server(port=0)
         
         # Save the credentials for the next run
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+        with open('token.json', 'w') as token:
+            token.write(creds.to_json())
     
-    return build('drive', 'v3', credentials=creds)
+    return creds
 
-def upload_to_google_drive(file_path, file_name):
-    """Upload a file to Google Drive in the 'Telegram Bot' folder and return the shareable link."""
-    try:
-        drive_service = authenticate_google_drive()
-        
-        # Get or create the Telegram Bot folder
-        folder_id = get_or_create_folder(drive_service, "Telegram Bot")
-        
+def get_drive_credentials():
+    """Return the shared Google Drive credentials, authenticating on first use."""
+    global _drive_credentials
+    
+    if _drive_credentials is None:
+        with _drive_credentials_lock:
+            if _drive_credentials is None:
+                _drive_credentials = authenticate_google_drive()
+    
+    return _drive_credentials
+
+def get_drive_service():
+    """Return the Google Drive service for the current thread, building it on first use."""
+    drive_service = getattr(_drive_local, 'service', None)
+    
+    if drive_service is None:
+        # Keep the HTTPS connection to Google alive across API calls
+        http = google_auth_httplib2.AuthorizedHttp(get_drive_credentials(), http=httplib2.Http())
+        drive_service = build('drive', 'v3', http=http, cache_discovery=False)
+        _drive_local.service = drive_service
+    
+    return drive_service
+
+class StreamingMediaUpload(MediaUpload):
+    """
+    Resumable upload body fed chunk by chunk from the event loop, so a file
+    can be uploaded to Google Drive while it is still being downloaded.
+    """
+
+    def __init__(self, loop, mimetype='application/octet-stream', chunksize=UPLOAD_CHUNK_SIZE, max_pending=UPLOAD_QUEUE_DEPTH):
+        self._loop = loop
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._queue = asyncio.Queue()
+        self._free_slots = asyncio.Semaphore(max_pending)
+        self._buffer = bytearray()
+        self._offset = 0
+        self._sent_end = 0
+        self._eof = False
+        self._error = None
+        self._aborted = False
+        self.bytes_written = 0
+
+    async def write(self, chunk):
+        """Queue a downloaded chunk for upload, waiting if the upload falls behind."""
+        await self._free_slots.acquire()
+        if self._aborted:
+            raise Exception("Upload to Google Drive was aborted")
+        self._queue.put_nowait(bytes(chunk))
+        self.bytes_written += len(chunk)
+
+    async def close(self):
+        """Signal that the download has finished."""
+        self._queue.put_nowait(None)
+
+    def abort(self):
+        """Stop the transfer on both sides. Must be called from the event loop."""
+        self._aborted = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(Exception("Download was aborted"))
+        # Wake the download if it is waiting for the upload to catch up
+        self._free_slots.release()
+
+    async def _next_chunk(self):
+        chunk = await self._queue.get()
+        self._free_slots.release()
+        return chunk
+
+    def _fill(self, end):
+        """Block the upload thread until the stream has reached `end` bytes or finished."""
+        while self._offset + len(self._buffer) < end and not self._eof:
+            if self._error:
+                raise self._error
+            chunk = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            if chunk is None:
+                self._eof = True
+            elif isinstance(chunk, Exception):
+                self._error = chunk
+            else:
+                self._buffer.extend(chunk)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # Asked before every chunk is sent. Read one byte past the next chunk so the
+        # total is known by the time the last chunk goes out, even when the stream
+        # ends exactly on a chunk boundary; until then it is unknown
+        self._fill(self._sent_end + self._chunksize + 1)
+        if self._eof:
+            return self._offset + len(self._buffer)
+        return None
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        """Called from the upload thread to get the next chunk to send."""
+        # Drop what Drive has acknowledged, keep the rest in case it is resent
+        del self._buffer[:begin - self._offset]
+        self._offset = begin
+
+        self._fill(begin + length)
+        data = bytes(self._buffer[:length])
+        self._sent_end = begin + len(data)
+        return data
+
+def upload_to_google_drive(media, file_name):
+    """Upload media to Google Drive in the 'Telegram Bot' folder and return the shareable link."""
+    global TELEGRAM_BOT_FOLDER_ID
+    
+    def create_file(drive_service, folder_id):
         # Create file metadata with parent folder
         file_metadata = {
             'name': file_name,
@@ -250,15 +483,32 @@ def upload_to_google_drive(file_path, file_name):
             'parents': [folder_id]  # Add the file to the specific folder
         }
         
-        # Create media object
-        media = MediaFileUpload(file_path, resumable=True)
-        
-        # Upload the file
-        file = drive_service.files().create(
+        return drive_service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id'
         ).execute()
+    
+    try:
+        drive_service = get_drive_service()
+        
+        # Get or create the Telegram Bot folder
+        folder_id = get_or_create_folder(drive_service, "Telegram Bot")
+        
+        # Upload the file
+        try:
+            file = create_file(drive_service, folder_id)
+        except ResumableUploadError as e:
+            # Raised when starting the upload, before any data is sent. A 404 means
+            # the cached folder was deleted, so look it up again and retry once
+            if e.resp.status != 404:
+                raise
+            logger.warning(f"Google Drive folder {folder_id} not found, resolving it again")
+            with _folder_lock:
+                # Only forget it if no other upload has replaced it already
+                if TELEGRAM_BOT_FOLDER_ID == folder_id:
+                    TELEGRAM_BOT_FOLDER_ID = None
+            file = create_file(drive_service, get_or_create_folder(drive_service, "Telegram Bot"))
         
         # Make the file publicly accessible
         drive_service.permissions().create(
@@ -274,40 +524,77 @@ def upload_to_google_drive(file_path, file_name):
         logger.error(f"Error uploading to Google Drive: {e}")
         return None
 
-async def download_with_telethon(file_id, file_path, status_msg=None):
-    """
-    Download a file using Telethon for more reliable large file downloads
-    """
+async def update_status(status_msg, text):
+    """Edit a status message, ignoring failures."""
+    try:
+        await status_msg.edit_text(text)
+    except:
+        pass  # Silently fail if we can't update the status
+
+async def get_telethon_client():
+    """Return the Telethon client, logging in first if that hasn't succeeded yet."""
     global telethon_client
     
-    try:
-        # Initialize Telethon client if not already done
+    async with _telethon_lock:
         if telethon_client is None:
-            telethon_client = TelegramClient('bot_session', API_ID, API_HASH)
-            await telethon_client.start(bot_token=TOKEN)
-        
-        # Get the file using Telethon
-        file = await telethon_client.get_messages(
-            entity=await telethon_client.get_me(),
-            ids=int(file_id)
-        )
+            try:
+                client = TelegramClient('bot_session', API_ID, API_HASH)
+                await client.start(bot_token=TOKEN)
+                telethon_client = client
+            except Exception as e:
+                logger.error(f"Error starting Telethon client: {e}")
+    
+    return telethon_client
+
+async def download_with_telethon(message, media, status_msg=None, file_size=None):
+    """
+    Download a file using Telethon for more reliable large file downloads,
+    streaming it straight into the Google Drive upload
+    """
+    try:
+        client = await get_telethon_client()
+        if client is None:
+            raise Exception("Telethon client is not connected")
+        
+        # Get the same message through MTProto. Private chats and basic groups share
+        # the bot's message ID space, so only channels need the chat to be resolved
+        if message.chat.type in (ChatType.CHANNEL, ChatType.SUPERGROUP):
+            entity = message.chat_id
+        else:
+            entity = None
+        file = await client.get_messages(entity, ids=message.message_id)
         
         if not file or not file.media:
             raise Exception("File not found using Telethon")
         
         # Download the file
         downloaded = 0
-        with open(file_path, 'wb') as f:
-            async for chunk in telethon_client.iter_download(file.media):
-                f.write(chunk)
+        last_update = time.monotonic()
+        progress_task = None
+        try:
+            async for chunk in client.iter_download(
+                file.media,
+                request_size=512 * 1024,  # Largest request Telegram allows
+                chunk_size=DOWNLOAD_CHUNK_SIZE,
+                file_size=file_size or None
+            ):
+                await media.write(chunk)
                 downloaded += len(chunk)
                 
-                # Update progress every 5MB
-                if downloaded % (5 * 1024 * 1024) == 0 and status_msg:
-                    try:
-                        await status_msg.edit_text(f"📥 Downloading... {downloaded // (1024 * 1024)}MB downloaded")
-                    except:
-                        pass  # Silently fail if we can't update the status
+                # Update progress every few seconds without waiting on Telegram
+                if (
+                    status_msg
+                    and time.monotonic() - last_update > PROGRESS_UPDATE_INTERVAL
+                    and (progress_task is None or progress_task.done())
+                ):
+                    progress_task = asyncio.create_task(
+                        update_status(status_msg, f"📥 Downloading... {downloaded // (1024 * 1024)}MB downloaded")
+                    )
+                    last_update = time.monotonic()
+        finally:
+            # Don't let a late progress update overwrite the next status, even on failure
+            if progress_task:
+                await progress_task
         
         return True
     except Exception as e:
@@ -330,18 +617,13 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Check if user has subscribed
-    if user_id not in user_subscription_status:
-        # Verify subscription status
-        is_subscribed = await check_subscription(user_id, context)
-        
-        if is_subscribed:
-            user_subscription_status[user_id] = True
-        else:
-            if update.message:
-                await update.message.reply_text("Please use /start first and subscribe to our channel to use this bot.")
-            return
+    if not await is_user_subscribed(user_id, context):
+        if update.message:
+            await update.message.reply_text("Please use /start first and subscribe to our channel to use this bot.")
+        return
         
-    temp_file_path = None
+    media = None
+    upload_task = None
     try:
         # Check if update has a message
         if not update.message:
@@ -351,7 +633,6 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.message
         
         # Determine file type and get file object
-        file_obj = None
         if message.document:
             file_obj = message.document
         elif message.photo:
@@ -368,11 +649,6 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await message.reply_text("Unsupported file type.")
             return
 
-        # Check if we found a file object
-        if not file_obj:
-            await message.reply_text("Could not process the file. Please try again.")
-            return
-
         # Get file information
         file_id = file_obj.file_id
         file_name = getattr(file_obj, 'file_name', 'file')
@@ -391,38 +667,58 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Notify user that download is starting
         status_msg = await message.reply_text(f"📥 Downloading your file ({file_size} bytes)...")
         
-        # Create a temporary file with a unique name
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_name)[1])
-        temp_file_path = temp_file.name
-        temp_file.close()
-        
-        # Try to download using Telethon (more reliable for large files)
-        download_success = await download_with_telethon(file_id, temp_file_path, status_msg)
+        # Limit how many transfers run at once to stay within Google Drive's rate limits
+        if _upload_semaphore.locked():
+            await status_msg.edit_text("⏳ Waiting for a free upload slot...")
         
-        if not download_success:
-            # Fall back to the standard method if Telethon fails
-            try:
-                # Get the file object from Telegram servers
-                file = await context.bot.get_file(file_id)
-                
-                # Download using the standard method
-                await file.download_to_drive(temp_file_path)
-            except Exception as e:
-                logger.error(f"Error downloading file with standard method: {e}")
+        async with _upload_semaphore:
+            folder_id = TELEGRAM_BOT_FOLDER_ID
+            
+            # Start uploading to Google Drive while the file is still downloading
+            media = StreamingMediaUpload(
+                asyncio.get_running_loop(),
+                mimetype=getattr(file_obj, 'mime_type', None) or 'application/octet-stream'
+            )
+            upload_task = asyncio.create_task(asyncio.to_thread(upload_to_google_drive, media, file_name))
+            
+            # Unblock the download if the upload gives up early
+            upload_task.add_done_callback(lambda _: media.abort())
+            
+            # Try to download using Telethon (more reliable for large files)
+            download_success = await download_with_telethon(message, media, status_msg, file_size)
+            
+            if not download_success and media.bytes_written == 0 and not upload_task.done():
+                # Fall back to the standard method if Telethon fails before sending any data
+                try:
+                    # Get the file object from Telegram servers
+                    file = await context.bot.get_file(file_id)
+                    
+                    # Download using the standard method
+                    await media.write(await file.download_as_bytearray())
+                    download_success = True
+                except Exception as e:
+                    logger.error(f"Error downloading file with standard method: {e}")
+            
+            if not download_success and not upload_task.done():
+                media.abort()
+                await upload_task
                 await status_msg.edit_text("❌ Failed to download file. Please try again.")
                 return
+            
+            if download_success:
+                await media.close()
+                
+                # Update status to show download completed
+                await status_msg.edit_text(
+                    f"📥 Download complete! ({media.bytes_written} bytes)\n"
+                    "☁️ Finishing upload to Google Drive..."
+                )
+            
+            drive_url = await upload_task
         
-        # Get the actual file size after download
-        downloaded_size = os.path.getsize(temp_file_path)
-        
-        # Update status to show download completed
-        await status_msg.edit_text(f"📥 Download complete! ({downloaded_size} bytes)")
-        
-        # Update status
-        await status_msg.edit_text("☁️ Uploading to Google Drive...")
-        
-        # Upload to Google Drive
-        drive_url = upload_to_google_drive(temp_file_path, file_name)
+        # Save the folder ID if this upload had to resolve it (e.g. the startup lookup failed)
+        if TELEGRAM_BOT_FOLDER_ID != folder_id:
+            await save_folder_id()
         
         if not drive_url:
             await status_msg.edit_text("❌ Failed to upload file to Google Drive. Please try again later.")
@@ -430,7 +726,7 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Shorten the URL
         await status_msg.edit_text("🔗 Generating short URL...")
-        short_url = shorten_url(drive_url)
+        short_url = await shorten_url(drive_url)
         
         # Format the response message
         response = (
@@ -450,19 +746,18 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await status_msg.edit_text(response, reply_markup=reply_markup)
         
         # ONLY send notification when a user successfully gets a download link
-        await send_download_notification(context, user, file_name, file_size, short_url)
+        task = asyncio.create_task(send_download_notification(context, user, file_name, file_size, short_url))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
         
     except Exception as e:
         logger.error(f"Error handling file: {e}", exc_info=True)
         await update.message.reply_text("Sorry, I couldn't process that file. Please try again.")
     
     finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                logger.error(f"Error deleting temp file: {e}")
+        # Make sure the upload thread is not left waiting for more data
+        if upload_task and not upload_task.done():
+            media.abort()
 
 async def get_my_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Command to get the user's chat ID"""
@@ -478,13 +773,64 @@ async def test_notification(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         await update.message.reply_text(f"Failed to send test notification: {e}")
 
+async def post_init(application: Application):
+    """Set up shared resources once the event loop is running."""
+    global _http_session, _redis, _telethon_lock, _upload_semaphore, TELEGRAM_BOT_FOLDER_ID
+    
+    # Run blocking Drive calls on a pool sized for the upload limit
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=UPLOAD_THREADS))
+    _upload_semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+    
+    _http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+    )
+    
+    # Log in to Telegram now so the first download doesn't wait for it
+    _telethon_lock = asyncio.Lock()
+    await get_telethon_client()
+    
+    if REDIS_URL:
+        _redis = redis.asyncio.from_url(REDIS_URL, decode_responses=True)
+        
+        # Reuse the folder ID found by a previous run
+        try:
+            TELEGRAM_BOT_FOLDER_ID = await _redis.get(FOLDER_ID_KEY)
+        except Exception as e:
+            logger.error(f"Error reading folder ID from Redis: {e}")
+    
+    # Resolve the Drive folder now so the first upload doesn't have to wait for it
+    if not TELEGRAM_BOT_FOLDER_ID:
+        try:
+            await asyncio.to_thread(lambda: get_or_create_folder(get_drive_service(), "Telegram Bot"))
+            await save_folder_id()
+        except Exception as e:
+            logger.error(f"Error resolving Google Drive folder: {e}")
+
+async def post_shutdown(application: Application):
+    """Release shared resources when the bot stops."""
+    if _http_session:
+        await _http_session.close()
+    if telethon_client:
+        await telethon_client.disconnect()
+    if _redis:
+        await _redis.aclose()
+
 def main():
     """Start the bot."""
+    # The bot runs in a background thread, which has no event loop by default
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    
     # Create the Application
-    application = Application.builder().token(TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(True)  # Let one user's transfer run alongside everyone else's updates
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add handlers
-    def run_bot():
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("myid", get_my_id))
@@ -492,8 +838,9 @@ def main():
     application.add_handler(CallbackQueryHandler(handle_subscription_callback))
     application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_file))
 
-    # Start the Bot
-    application.run_polling()
+    # Start the Bot, long-polling so idle periods cost one request every 30 seconds.
+    # Signal handlers can only be installed on the main thread.
+    application.run_polling(timeout=30, stop_signals=None)
 
 flask_app = Flask(__name__)
 
@@ -503,6 +850,6 @@ def home():
 
 if __name__ == "__main__":
     # Run Telegram bot in a background thread
-    threading.Thread(target=run_bot).start()
+    threading.Thread(target=main).start()
     # Start Flask server on main thread
     flask_app.run(host="0.0.0.0", port=8080)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# file.py reads its configuration from the environment at import time
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+os.environ.setdefault("CHANNEL_USERNAME", "test_channel")
+os.environ.setdefault("CREATOR_USERNAME", "@test_creator")
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "test-hash")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from googleapiclient.errors import ResumableUploadError
+from googleapiclient.http import HttpMockSequence, HttpRequest
+
+from file import StreamingMediaUpload
+
+CHUNK_SIZE = 8
+SESSION = ({'status': '200', 'location': 'http://upload/session'}, '')
+DONE = ({'status': '200'}, '{"id": "file-id"}')
+
+
+def resume(last_byte):
+    return ({'status': '308', 'range': f'bytes=0-{last_byte}'}, '')
+
+
+class RecordingHttp(HttpMockSequence):
+    """HttpMockSequence that also records the chunk uploads it receives."""
+
+    def __init__(self, iterable):
+        super().__init__(iterable)
+        self.chunks = []
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        if uri == 'http://upload/session':
+            self.chunks.append((headers.get('Content-Range'), body))
+        return super().request(uri, method, body, headers, *args, **kwargs)
+
+
+def pieces(data, size=3):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+async def start_upload(responses, max_pending=8):
+    media = StreamingMediaUpload(asyncio.get_running_loop(), chunksize=CHUNK_SIZE, max_pending=max_pending)
+    http = RecordingHttp(responses)
+    request = HttpRequest(http, lambda resp, content: content, 'http://upload', method='POST', headers={}, resumable=media)
+    upload = asyncio.create_task(asyncio.to_thread(request.execute))
+    return media, http, upload
+
+
+def stream(data, responses):
+    async def run():
+        media, http, upload = await start_upload(responses)
+        for piece in pieces(data):
+            await media.write(piece)
+        await media.close()
+        return await upload, http.chunks
+
+    return asyncio.run(run())
+
+
+def test_empty_file():
+    body, chunks = stream(b'', [SESSION, DONE])
+
+    assert body == b'{"id": "file-id"}'
+    assert chunks == [(None, b'')]
+
+
+def test_smaller_than_one_chunk():
+    body, chunks = stream(b'hello', [SESSION, DONE])
+
+    assert body == b'{"id": "file-id"}'
+    assert chunks == [('bytes 0-4/5', b'hello')]
+
+
+@pytest.mark.parametrize('chunk_count', [1, 2, 3])
+def test_exact_multiple_of_chunk_size(chunk_count):
+    data = bytes(range(CHUNK_SIZE * chunk_count))
+    responses = [SESSION] + [resume(CHUNK_SIZE * i - 1) for i in range(1, chunk_count)] + [DONE]
+
+    body, chunks = stream(data, responses)
+
+    assert body == b'{"id": "file-id"}'
+    total = len(data)
+    assert [header for header, _ in chunks] == [
+        f'bytes {start}-{start + CHUNK_SIZE - 1}/{"*" if start + CHUNK_SIZE < total else total}'
+        for start in range(0, total, CHUNK_SIZE)
+    ]
+    assert b''.join(chunk for _, chunk in chunks) == data
+
+
+def test_partial_range_resends_unacknowledged_bytes():
+    data = bytes(range(20))
+
+    body, chunks = stream(data, [SESSION, resume(4), resume(12), DONE])
+
+    assert body == b'{"id": "file-id"}'
+    assert chunks == [
+        ('bytes 0-7/*', data[0:8]),
+        ('bytes 5-12/*', data[5:13]),
+        ('bytes 13-19/20', data[13:20]),
+    ]
+
+
+def test_abort_from_download_side_fails_upload():
+    async def run():
+        media, http, upload = await start_upload([SESSION, DONE])
+        await media.write(b'abc')
+        media.abort()
+        with pytest.raises(Exception, match='aborted'):
+            await upload
+        assert http.chunks == []
+
+    asyncio.run(run())
+
+
+def test_abort_from_upload_side_unblocks_download():
+    async def run():
+        media, http, upload = await start_upload([({'status': '400'}, 'bad request')], max_pending=1)
+        # handle_file aborts the stream as soon as the upload task finishes
+        upload.add_done_callback(lambda _: media.abort())
+
+        with pytest.raises(Exception, match='aborted'):
+            for _ in range(100):
+                await media.write(b'x' * CHUNK_SIZE)
+        with pytest.raises(ResumableUploadError):
+            await upload
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
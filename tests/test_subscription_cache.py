@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from cachetools import TLRUCache
+
+import file
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, key):
+        self.commands.append(('get', key))
+        return self
+
+    def ttl(self, key):
+        self.commands.append(('ttl', key))
+        return self
+
+    async def execute(self):
+        self.redis.reads += 1
+        results = []
+        for command, key in self.commands:
+            value, ttl = self.redis.lookup(key)
+            results.append(value if command == 'get' else ttl)
+        return results
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the subscription cache, on a fake clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.reads = 0
+
+    def store(self, key, value, ttl=None):
+        self.data[key] = (value, None if ttl is None else self.clock() + ttl)
+
+    async def setex(self, key, ttl, value):
+        self.store(key, value, ttl)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def lookup(self, key):
+        if key not in self.data:
+            return None, -2
+        value, expires = self.data[key]
+        if expires is None:
+            return value, -1
+        if expires <= self.clock():
+            del self.data[key]
+            return None, -2
+        return value, int(expires - self.clock())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    for name in ('user_subscription_status', 'user_unsubscribed_status'):
+        cache = getattr(file, name)
+        monkeypatch.setattr(file, name, TLRUCache(maxsize=100, ttu=cache.ttu, timer=clock))
+    return clock
+
+
+@pytest.fixture
+def redis(monkeypatch, clock):
+    redis = FakeRedis(clock)
+    monkeypatch.setattr(file, '_redis', redis)
+    return redis
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    """Stub for check_subscription that records who was checked."""
+    telegram = {'subscribed': True, 'checks': []}
+
+    async def check_subscription(user_id, context):
+        telegram['checks'].append(user_id)
+        return telegram['subscribed']
+
+    monkeypatch.setattr(file, 'check_subscription', check_subscription)
+    return telegram
+
+
+def is_user_subscribed(user_id):
+    return asyncio.run(file.is_user_subscribed(user_id, context=None))
+
+
+def test_cache_hit_skips_redis_and_telegram(clock, redis, telegram):
+    assert is_user_subscribed(1) is True
+    assert telegram['checks'] == [1]
+    assert redis.lookup('sub:1') == ('1', file.SUBSCRIBED_TTL)
+
+    clock.now += file.SUBSCRIBED_TTL - 1
+    reads = redis.reads
+
+    assert is_user_subscribed(1) is True
+    assert telegram['checks'] == [1]
+    assert redis.reads == reads
+
+
+def test_redis_hit_is_cached_only_for_the_remaining_ttl(clock, redis, telegram):
+    redis.store('sub:2', '1', ttl=30)
+
+    assert is_user_subscribed(2) is True
+    assert redis.reads == 1
+
+    # Served from the local cache while the Redis key is still alive
+    clock.now += 29
+    assert is_user_subscribed(2) is True
+    assert redis.reads == 1
+    assert telegram['checks'] == []
+
+    # Both copies have expired, so Telegram is asked again
+    clock.now += 2
+    telegram['subscribed'] = False
+    assert is_user_subscribed(2) is False
+    assert redis.reads == 2
+    assert telegram['checks'] == [2]
+
+
+def test_redis_hit_without_ttl_is_not_cached_locally(redis, telegram):
+    redis.store('sub:3', '1')
+
+    assert is_user_subscribed(3) is True
+    assert is_user_subscribed(3) is True
+    assert redis.reads == 2
+    assert telegram['checks'] == []
+
+
+def test_negative_result_expires_after_unsubscribed_ttl(clock, redis, telegram):
+    telegram['subscribed'] = False
+
+    assert is_user_subscribed(4) is False
+    assert redis.lookup('sub:4') == ('0', file.UNSUBSCRIBED_TTL)
+    assert 4 not in file.user_subscription_status
+
+    clock.now += file.UNSUBSCRIBED_TTL - 1
+    assert is_user_subscribed(4) is False
+    assert telegram['checks'] == [4]
+
+    # After subscribing, the user is let in once the short negative TTL runs out
+    clock.now += 2
+    telegram['subscribed'] = True
+    assert is_user_subscribed(4) is True
+    assert telegram['checks'] == [4, 4]
+    assert 4 not in file.user_unsubscribed_status
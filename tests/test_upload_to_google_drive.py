@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMockSequence
+
+import file
+from file import StreamingMediaUpload
+
+
+def test_stale_folder_is_resolved_again(monkeypatch):
+    http = HttpMockSequence([
+        ({'status': '404'}, json.dumps({'error': {'code': 404, 'message': 'File not found: stale-folder'}})),
+        ({'status': '200'}, json.dumps({'files': [{'id': 'new-folder'}]})),
+        ({'status': '200', 'location': 'http://upload/session'}, ''),
+        ({'status': '200'}, json.dumps({'id': 'file-id'})),
+        ({'status': '200'}, json.dumps({'id': 'anyoneWithLink'})),
+    ])
+    drive_service = build('drive', 'v3', http=http)
+    monkeypatch.setattr(file, 'get_drive_service', lambda: drive_service)
+    monkeypatch.setattr(file, 'TELEGRAM_BOT_FOLDER_ID', 'stale-folder')
+
+    async def run():
+        media = StreamingMediaUpload(asyncio.get_running_loop())
+        upload = asyncio.create_task(asyncio.to_thread(file.upload_to_google_drive, media, 'test.txt'))
+        await media.write(b'hello')
+        await media.close()
+        return await upload
+
+    assert asyncio.run(run()) == 'https://drive.google.com/uc?id=file-id&export=download'
+    assert file.TELEGRAM_BOT_FOLDER_ID == 'new-folder'
+
+
+def test_concurrent_lookups_create_a_single_folder(monkeypatch):
+    monkeypatch.setattr(file, 'TELEGRAM_BOT_FOLDER_ID', None)
+    created = []
+
+    class Request:
+        def __init__(self, result):
+            self.result = result
+
+        def execute(self):
+            time.sleep(0.05)  # Give the other threads a chance to race
+            return self.result
+
+    class Files:
+        def list(self, **kwargs):
+            return Request({'files': []})
+
+        def create(self, **kwargs):
+            created.append(kwargs)
+            return Request({'id': f'folder-{len(created)}'})
+
+    class DriveService:
+        def files(self):
+            return Files()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        folder_ids = list(pool.map(lambda _: file.get_or_create_folder(DriveService()), range(8)))
+
+    assert len(created) == 1
+    assert folder_ids == ['folder-1'] * 8